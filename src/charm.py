@@ -8,12 +8,17 @@ This charm is meant to be used only for testing
 of the libraries in this repository.
 """
 
+import ctypes
 import json
 import logging
 import os
-import pathlib
+import select
 import signal
+import struct
 import subprocess
+import sys
+import time
+from functools import cached_property
 
 import ops.lib
 import psycopg2
@@ -23,7 +28,6 @@ from charms.data_platform_libs.v0.data_interfaces import (
     DatabaseRequires,
 )
 from ops import ActionEvent, ActiveStatus, CharmBase, Relation, StartEvent, main
-from tenacity import RetryError, Retrying, stop_after_delay, wait_fixed
 
 logger = logging.getLogger(__name__)
 
@@ -37,11 +41,162 @@ PEER = "postgresql-test-peers"
 LAST_WRITTEN_FILE = "/tmp/last_written_value"  # noqa: S108
 CONFIG_FILE = "/tmp/continuous_writes_config"  # noqa: S108
 PROC_PID_KEY = "proc-pid"
+# How long to wait for the continuous writes script to report the last written value.
+STOP_WRITES_TIMEOUT = 60
+# How often to check for that value when inotify is not available.
+STOP_WRITES_POLL_INTERVAL = 1
+
+# Rows converted to Python objects at once from the run-sql action cursor.
+RUN_SQL_FETCH_SIZE = 2000
+# Upper bound (in bytes) of the run-sql action results, which are sent through Juju anyway.
+RUN_SQL_MAX_RESULTS_SIZE = 256 * 1024
+
+# inotify(7) constants.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+
+class FileWatcher:
+    """Waits for a file to be written, using inotify instead of polling for it.
+
+    The watch is set up when entering the context, so that writes done after that
+    (e.g. by a process that is signalled inside the context) are not missed. If it can't be set
+    up (e.g. when the inotify instances or watches limits are reached), the file is polled for.
+    """
+
+    def __init__(self, path: str):
+        self.directory, self.filename = os.path.split(path)
+        self.path = path
+        self._fd = -1
+
+    def __enter__(self) -> "FileWatcher":
+        """Starts watching the directory of the file."""
+        try:
+            self._fd = self._add_watch()
+        except OSError as e:
+            logger.warning(f"Unable to watch {self.directory}, polling for {self.filename}: {e}")
+        return self
+
+    def __exit__(self, *_) -> None:
+        """Stops watching the directory of the file."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _add_watch(self) -> int:
+        """Returns an inotify file descriptor watching the directory of the file."""
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(fd, self.directory.encode(), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, os.strerror(errno), self.directory)
+        return fd
+
+    def wait(self, timeout: float) -> bool:
+        """Blocks until the file is written or the timeout expires.
+
+        Returns:
+            whether the file was written (or already existed).
+        """
+        if os.path.exists(self.path):
+            return True
+
+        deadline = time.monotonic() + timeout
+        if self._fd < 0:
+            while (remaining := deadline - time.monotonic()) > 0:
+                time.sleep(min(STOP_WRITES_POLL_INTERVAL, remaining))
+                if os.path.exists(self.path):
+                    return True
+            return False
+
+        while (remaining := deadline - time.monotonic()) > 0:
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if not ready:
+                break
+            buffer = os.read(self._fd, 4096)
+            offset = 0
+            while offset < len(buffer):
+                _, _, _, length = INOTIFY_EVENT_HEADER.unpack_from(buffer, offset)
+                offset += INOTIFY_EVENT_HEADER.size
+                name = buffer[offset : offset + length].rstrip(b"\0").decode()
+                offset += length
+                if name == self.filename:
+                    return True
+        return False
+
+
+def _dump_rows(cursor: psycopg2.extensions.cursor) -> tuple[str, bool]:
+    """Serializes the rows of a cursor as a JSON list of at most RUN_SQL_MAX_RESULTS_SIZE bytes.
+
+    Only the size of the JSON output is capped: the (client side) cursor already holds the whole
+    result set in libpq memory, and fetchmany just limits how many rows are converted to Python
+    objects at once. The rows that don't fit are left out of the list: the rest of the batch
+    holding the first of them is dropped and the following batches are not converted.
+
+    Returns:
+        the JSON list and whether it was truncated.
+    """
+    rows = []
+    size = len("[]")
+    while batch := cursor.fetchmany(RUN_SQL_FETCH_SIZE):
+        for row in batch:
+            dumped_row = json.dumps(row)
+            size += len(dumped_row) + len(", ")
+            if size > RUN_SQL_MAX_RESULTS_SIZE:
+                logger.warning(f"query results truncated to {len(rows)} rows")
+                return f"[{', '.join(rows)}]", True
+            rows.append(dumped_row)
+    return f"[{', '.join(rows)}]", False
 
 
 class ApplicationCharm(CharmBase):
     """Application charm that connects to database charms."""
 
+    # Observers of the events defined in the database requires charm library,
+    # as (requirer attribute, event name, handler name).
+    _DATABASE_EVENT_OBSERVERS = (
+        ("database", "database_created", "_on_database_created"),
+        ("database", "endpoints_changed", "_on_database_endpoints_changed"),
+        ("second_database", "database_created", "_on_second_database_created"),
+        ("second_database", "endpoints_changed", "_on_second_database_endpoints_changed"),
+        ("database_clusters", "database_created", "_on_cluster_database_created"),
+        ("database_clusters", "endpoints_changed", "_on_cluster_endpoints_changed"),
+        # Each aliased database cluster has its own events, prefixed by its alias.
+        (
+            "aliased_database_clusters",
+            "cluster1_database_created",
+            "_on_cluster1_database_created",
+        ),
+        (
+            "aliased_database_clusters",
+            "cluster1_endpoints_changed",
+            "_on_cluster1_endpoints_changed",
+        ),
+        (
+            "aliased_database_clusters",
+            "cluster2_database_created",
+            "_on_cluster2_database_created",
+        ),
+        (
+            "aliased_database_clusters",
+            "cluster2_endpoints_changed",
+            "_on_cluster2_endpoints_changed",
+        ),
+    )
+    # Database relations whose removal resets the unit status.
+    _DATABASE_RELATIONS = (
+        "database",
+        "second-database",
+        "multiple-database-clusters",
+        "aliased-multiple-database-clusters",
+    )
+
     @property
     def _peers(self) -> Relation | None:
         """Retrieve the peer relation (`ops.model.Relation`)."""
@@ -57,100 +212,64 @@ class ApplicationCharm(CharmBase):
 
     def __init__(self, *args):
         super().__init__(*args)
+        self._connection = None
 
         # Default charm events.
         self.framework.observe(self.on.start, self._on_start)
 
-        # Events related to the first database that is requested
-        # (these events are defined in the database requires charm library).
-        self.database_name = f"{self.app.name.replace('-', '_')}_database"
-        self.database = DatabaseRequires(self, "database", self.database_name, EXTRA_USER_ROLES)
-        self.framework.observe(self.database.on.database_created, self._on_database_created)
-        self.framework.observe(
-            self.database.on.endpoints_changed, self._on_database_endpoints_changed
-        )
-        self.framework.observe(self.on["database"].relation_broken, self._on_relation_broken)
-        self.framework.observe(
-            self.on.clear_continuous_writes_action, self._on_clear_continuous_writes_action
-        )
-        self.framework.observe(
-            self.on.start_continuous_writes_action, self._on_start_continuous_writes_action
-        )
-        self.framework.observe(
-            self.on.stop_continuous_writes_action, self._on_stop_continuous_writes_action
-        )
-        self.framework.observe(
-            self.on.show_continuous_writes_action, self._on_show_continuous_writes_action
-        )
+        # The database requirers are created on every dispatch, even if the hook is unrelated to
+        # their relations: they must observe their own relation events (and re-emitted deferred
+        # ones) for the charm library to work.
+        database_prefix = self.app.name.replace("-", "_")
 
-        # Events related to the second database that is requested
-        # (these events are defined in the database requires charm library).
-        database_name = f"{self.app.name.replace('-', '_')}_second_database"
+        # Requirer for the first database, used by the continuous writes and run-sql actions.
+        self.database_name = f"{database_prefix}_database"
+        self.database = DatabaseRequires(self, "database", self.database_name, EXTRA_USER_ROLES)
+        # Requirer for the second database.
         self.second_database = DatabaseRequires(
-            self, "second-database", database_name, EXTRA_USER_ROLES
-        )
-        self.framework.observe(
-            self.second_database.on.database_created, self._on_second_database_created
+            self, "second-database", f"{database_prefix}_second_database", EXTRA_USER_ROLES
         )
-        self.framework.observe(
-            self.second_database.on.endpoints_changed, self._on_second_database_endpoints_changed
-        )
-        self.framework.observe(
-            self.on["second-database"].relation_broken, self._on_relation_broken
-        )
-
-        # Multiple database clusters charm events (clusters/relations without alias).
-        database_name = f"{self.app.name.replace('-', '_')}_multiple_database_clusters"
+        # Multiple database clusters (clusters/relations without alias).
         self.database_clusters = DatabaseRequires(
-            self, "multiple-database-clusters", database_name, EXTRA_USER_ROLES
-        )
-        self.framework.observe(
-            self.database_clusters.on.database_created, self._on_cluster_database_created
-        )
-        self.framework.observe(
-            self.database_clusters.on.endpoints_changed,
-            self._on_cluster_endpoints_changed,
-        )
-        self.framework.observe(
-            self.on["multiple-database-clusters"].relation_broken, self._on_relation_broken
+            self,
+            "multiple-database-clusters",
+            f"{database_prefix}_multiple_database_clusters",
+            EXTRA_USER_ROLES,
         )
-
-        # Multiple database clusters charm events (defined dynamically
-        # in the database requires charm library, using the provided cluster/relation aliases).
-        database_name = f"{self.app.name.replace('-', '_')}_aliased_multiple_database_clusters"
-        cluster_aliases = ["cluster1", "cluster2"]  # Aliases for the multiple clusters/relations.
+        # Multiple database clusters (events are defined dynamically in the database requires
+        # charm library, with the cluster/relation aliases as their prefix).
         self.aliased_database_clusters = DatabaseRequires(
             self,
             "aliased-multiple-database-clusters",
-            database_name,
+            f"{database_prefix}_aliased_multiple_database_clusters",
             EXTRA_USER_ROLES,
-            cluster_aliases,
-        )
-        # Each database cluster will have its own events
-        # with the name having the cluster/relation alias as the prefix.
-        self.framework.observe(
-            self.aliased_database_clusters.on.cluster1_database_created,
-            self._on_cluster1_database_created,
+            ["cluster1", "cluster2"],  # Aliases for the multiple clusters/relations.
         )
+        # Relation used to test the situation where no database name is provided.
+        self.no_database = DatabaseRequires(self, "no-database", database_name="")
+
+        for requirer, event, handler in self._DATABASE_EVENT_OBSERVERS:
+            self.framework.observe(
+                getattr(getattr(self, requirer).on, event), getattr(self, handler)
+            )
+        for relation_name in self._DATABASE_RELATIONS:
+            self.framework.observe(
+                self.on[relation_name].relation_broken, self._on_relation_broken
+            )
+
         self.framework.observe(
-            self.aliased_database_clusters.on.cluster1_endpoints_changed,
-            self._on_cluster1_endpoints_changed,
+            self.on.clear_continuous_writes_action, self._on_clear_continuous_writes_action
         )
         self.framework.observe(
-            self.aliased_database_clusters.on.cluster2_database_created,
-            self._on_cluster2_database_created,
+            self.on.start_continuous_writes_action, self._on_start_continuous_writes_action
         )
         self.framework.observe(
-            self.aliased_database_clusters.on.cluster2_endpoints_changed,
-            self._on_cluster2_endpoints_changed,
+            self.on.stop_continuous_writes_action, self._on_stop_continuous_writes_action
         )
         self.framework.observe(
-            self.on["aliased-multiple-database-clusters"].relation_broken, self._on_relation_broken
+            self.on.show_continuous_writes_action, self._on_show_continuous_writes_action
         )
 
-        # Relation used to test the situation where no database name is provided.
-        self.no_database = DatabaseRequires(self, "no-database", database_name="")
-
         # Legacy interface
         self.db = pgsql.PostgreSQLClient(self, "db")
         self.framework.observe(
@@ -162,10 +281,19 @@ class ApplicationCharm(CharmBase):
 
     def are_writes_running(self) -> bool:
         """Returns whether continuous writes script is running."""
+        pid = int(self.app_peer_data[PROC_PID_KEY])
         try:
-            os.kill(int(self.app_peer_data[PROC_PID_KEY]))
-            return True
-        except Exception:
+            # Signal 0 only checks that the process exists.
+            os.kill(pid, 0)
+        except (ProcessLookupError, PermissionError):
+            # A process owned by another user can't be the script started by this charm.
+            return False
+
+        # The PID may have been reused by another process after a machine or pod restart.
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as fd:
+                return b"continuous_writes.py" in fd.read()
+        except FileNotFoundError:
             return False
 
     def _on_start(self, event: StartEvent) -> None:
@@ -177,13 +305,15 @@ class ApplicationCharm(CharmBase):
             and not self.are_writes_running()
         ):
             try:
-                writes = self._get_db_writes()
+                writes = self._count_db_writes()
             except Exception:
                 logger.debug("Connection to db not yet available")
                 event.defer()
                 return
             if writes > 0:
                 logger.info("Restarting continuous writes from db")
+                # No need to stop the writes first: the stored PID is not the writes script
+                # anymore and it's replaced by the one of the new process.
                 self._start_continuous_writes(writes + 1)
 
     # First database events observers.
@@ -196,23 +326,15 @@ class ApplicationCharm(CharmBase):
     def _on_database_endpoints_changed(self, event: DatabaseEndpointsChangedEvent) -> None:
         """Event triggered when the read/write endpoints of the database change."""
         logger.info(f"first database endpoints have been changed to: {event.endpoints}")
-        if self._connection_string is None:
+        if self._connection_params is None:
             return
 
-        if not self.app_peer_data.get(PROC_PID_KEY):
+        if not self.app_peer_data.get(PROC_PID_KEY) or not self.are_writes_running():
             return None
 
-        with open(CONFIG_FILE, "w") as fd:
-            fd.write(self._connection_string)
-            os.fsync(fd)
-
-        try:
-            os.kill(int(self.app_peer_data[PROC_PID_KEY]), signal.SIGKILL)
-        except ProcessLookupError:
-            del self.app_peer_data[PROC_PID_KEY]
-            return
-        count = self._count_writes()
-        self._start_continuous_writes(count + 1)
+        # Make the continuous writes script reconnect using the new endpoints.
+        self._write_config_file()
+        os.kill(int(self.app_peer_data[PROC_PID_KEY]), signal.SIGHUP)
 
     def _on_relation_broken(self, _) -> None:
         """Event triggered when a database relation is left."""
@@ -268,15 +390,15 @@ class ApplicationCharm(CharmBase):
         logger.info(f"cluster2 endpoints have been changed to: {event.endpoints}")
 
     # HA event observers
-    @property
-    def _connection_string(self) -> str | None:
-        """Returns the PostgreSQL connection string."""
-        db_data = list(self.database.fetch_relation_data().values())
-        data = (
-            db_data[0]
-            if db_data
-            else next(data for data in self.database.fetch_relation_data().values())
-        )
+    @cached_property
+    def _connection_params(self) -> dict | None:
+        """Returns the PostgreSQL connection parameters (as psycopg2.connect keyword arguments).
+
+        Relation data doesn't change during a single hook, so it's built only once per dispatch.
+        """
+        data = next(iter(self.database.fetch_relation_data().values()), None)
+        if data is None:
+            return None
 
         username = data.get("username")
         password = data.get("password")
@@ -290,25 +412,34 @@ class ApplicationCharm(CharmBase):
         if not host or host == "None":
             return None
 
-        return (
-            f"dbname='{database}' user='{username}'"
-            f" host='{host}' password='{password}' port={port} connect_timeout=5"
-        )
-
-    def _count_writes(self) -> int:
-        """Count the number of records in the continuous_writes table."""
-        with (
-            psycopg2.connect(self._connection_string) as connection,
-            connection.cursor() as cursor,
-        ):
-            cursor.execute("SELECT COUNT(number) FROM continuous_writes;")
-            count = cursor.fetchone()[0]
-        connection.close()
-        return count
+        return {
+            "dbname": database,
+            "user": username,
+            "host": host,
+            "password": password,
+            "port": port,
+            "connect_timeout": 5,
+            # Detect dead servers (e.g. a failed primary) instead of hanging on them.
+            "keepalives": 1,
+            "keepalives_idle": 30,
+            "keepalives_count": 1,
+            "tcp_user_timeout": 30000,
+        }
+
+    def _get_connection(self) -> psycopg2.extensions.connection:
+        """Returns a connection to the first database, reused during the whole hook.
+
+        A new connection is opened if there is none yet or if the previous one was closed
+        (e.g. after a connection failure).
+        """
+        if self._connection is None or self._connection.closed:
+            self._connection = psycopg2.connect(**self._connection_params)
+            self._connection.autocommit = True
+        return self._connection
 
     def _on_clear_continuous_writes_action(self, event: ActionEvent) -> None:
         """Clears database writes."""
-        if self._connection_string is None:
+        if self._connection_params is None:
             event.set_results({"result": "False"})
             return
 
@@ -320,21 +451,21 @@ class ApplicationCharm(CharmBase):
             return
 
         try:
-            with (
-                psycopg2.connect(self._connection_string) as connection,
-                connection.cursor() as cursor,
-            ):
+            with self._get_connection().cursor() as cursor:
                 cursor.execute("DROP TABLE IF EXISTS continuous_writes;")
             event.set_results({"result": "True"})
         except Exception as e:
             event.set_results({"result": "False"})
             logger.exception("Unable to drop table", exc_info=e)
-        finally:
-            connection.close()
 
     def _on_start_continuous_writes_action(self, event: ActionEvent) -> None:
         """Start the continuous writes process."""
-        if self._connection_string is None:
+        if self._connection_params is None:
+            event.set_results({"result": "False"})
+            return
+
+        if self.config["batch_size"] < 1:
+            logger.error(f"Invalid batch_size {self.config['batch_size']}: it must be at least 1")
             event.set_results({"result": "False"})
             return
 
@@ -348,11 +479,7 @@ class ApplicationCharm(CharmBase):
         try:
             # Create the table to write records on and also a unique index to prevent duplicate
             # writes.
-            with (
-                psycopg2.connect(self._connection_string) as connection,
-                connection.cursor() as cursor,
-            ):
-                connection.autocommit = True
+            with self._get_connection().cursor() as cursor:
                 cursor.execute("CREATE TABLE IF NOT EXISTS continuous_writes(number INTEGER);")
                 cursor.execute(
                     "CREATE UNIQUE INDEX IF NOT EXISTS number ON continuous_writes(number);"
@@ -361,27 +488,23 @@ class ApplicationCharm(CharmBase):
             event.set_results({"result": "False"})
             logger.exception("Unable to create table", exc_info=e)
             return
-        finally:
-            connection.close()
 
         self._start_continuous_writes(1)
         event.set_results({"result": "True"})
 
+    def _count_db_writes(self) -> int:
+        """Count the continuous writes, raising if the database can't be reached."""
+        with self._get_connection().cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM continuous_writes;")
+            return cursor.fetchone()[0]
+
     def _get_db_writes(self) -> int:
+        """Count the continuous writes (or -1 if it was not possible to count them)."""
         try:
-            with (
-                psycopg2.connect(self._connection_string) as connection,
-                connection.cursor() as cursor,
-            ):
-                connection.autocommit = True
-                cursor.execute("SELECT COUNT(*) FROM continuous_writes;")
-                writes = cursor.fetchone()[0]
+            return self._count_db_writes()
         except Exception:
-            writes = -1
             logger.exception("Unable to count writes")
-        finally:
-            connection.close()
-        return writes
+            return -1
 
     def _on_show_continuous_writes_action(self, event: ActionEvent) -> None:
         """Count the continuous writes."""
@@ -392,25 +515,43 @@ class ApplicationCharm(CharmBase):
         writes = self._stop_continuous_writes()
         event.set_results({"writes": writes})
 
+    def _write_config_file(self) -> None:
+        """Writes the connection parameters used by the continuous writes script.
+
+        The file is replaced atomically, so the script never reads a partially written one.
+        """
+        tmp_file = f"{CONFIG_FILE}.tmp"
+        with open(tmp_file, "w") as fd:
+            json.dump(self._connection_params, fd)
+        os.rename(tmp_file, CONFIG_FILE)
+
     def _start_continuous_writes(self, starting_number: int) -> None:
-        """Starts continuous writes to PostgreSQL instance."""
-        if self._connection_string is None:
-            return
+        """Starts continuous writes to PostgreSQL instance.
 
-        # Stop any writes that might be going.
-        self._stop_continuous_writes()
+        The caller must ensure that no continuous writes process is running anymore.
+        """
+        if self._connection_params is None:
+            return
 
-        with open(CONFIG_FILE, "w") as fd:
-            fd.write(self._connection_string)
-            os.fsync(fd)
+        # A batch of less than one number would be counted as written without writing anything.
+        if self.config["batch_size"] < 1:
+            logger.error(f"Invalid batch_size {self.config['batch_size']}: it must be at least 1")
+            return
 
-        # Run continuous writes in the background.
-        popen = subprocess.Popen([  # noqa: S603
-            str(pathlib.Path("venv/bin/python").absolute()),
-            "src/continuous_writes.py",
-            str(starting_number),
-            str(self.config["sleep_interval"]),
-        ])
+        self._write_config_file()
+
+        # Run continuous writes in the background, with the same interpreter as the charm (and
+        # the bundled libpq, which psycopg2 needs).
+        popen = subprocess.Popen(  # noqa: S603
+            [
+                sys.executable,
+                "src/continuous_writes.py",
+                str(starting_number),
+                str(self.config["sleep_interval"]),
+                str(self.config["batch_size"]),
+            ],
+            env={**os.environ, "LD_LIBRARY_PATH": "lib"},
+        )
 
         # Store the continuous writes process ID to stop the process later.
         self.app_peer_data[PROC_PID_KEY] = str(popen.pid)
@@ -420,23 +561,23 @@ class ApplicationCharm(CharmBase):
         if not self.app_peer_data.get(PROC_PID_KEY):
             return None
 
-        # Stop the process.
-        try:
-            os.kill(int(self.app_peer_data[PROC_PID_KEY]), signal.SIGTERM)
-        except ProcessLookupError:
+        with FileWatcher(LAST_WRITTEN_FILE) as watcher:
+            # Stop the process.
+            try:
+                os.kill(int(self.app_peer_data[PROC_PID_KEY]), signal.SIGTERM)
+            except ProcessLookupError:
+                del self.app_peer_data[PROC_PID_KEY]
+                return None
+
             del self.app_peer_data[PROC_PID_KEY]
-            return None
 
-        del self.app_peer_data[PROC_PID_KEY]
+            # Return the max written value (or -1 if it was not possible to get that value).
+            if not watcher.wait(STOP_WRITES_TIMEOUT):
+                logger.error("Unable to read result: timed out waiting for the last written value")
+                return -1
 
-        # Return the max written value (or -1 if it was not possible to get that value).
-        try:
-            for attempt in Retrying(stop=stop_after_delay(60), wait=wait_fixed(5)):
-                with attempt, open(LAST_WRITTEN_FILE) as fd:
-                    last_written_value = int(fd.read())
-        except RetryError as e:
-            logger.exception("Unable to read result", exc_info=e)
-            return -1
+        with open(LAST_WRITTEN_FILE) as fd:
+            last_written_value = int(fd.read())
 
         os.remove(LAST_WRITTEN_FILE)
         os.remove(CONFIG_FILE)
@@ -471,8 +612,12 @@ class ApplicationCharm(CharmBase):
             relation = self.second_database
         else:
             event.fail(message="invalid relation name")
+            return
 
-        databag = next(databag for databag in relation.fetch_relation_data().values())
+        databag = next(iter(relation.fetch_relation_data().values()), {})
+        if not databag:
+            event.fail(message="relation data not available")
+            return
 
         dbname = event.params["dbname"]
         query = event.params["query"]
@@ -484,8 +629,7 @@ class ApplicationCharm(CharmBase):
             dbname = f"{dbname}_readonly"
         else:
             host = databag.get("endpoints").split(",")[0]
-        endpoint = host.split(":")[0]
-        port = host.split(":")[1]
+        endpoint, port = host.split(":", 1)
 
         logger.info(f"running query: \n{query}")
         connection = self.connect_to_database(
@@ -495,12 +639,12 @@ class ApplicationCharm(CharmBase):
         cursor.execute(query)
 
         try:
-            results = cursor.fetchall()
+            results, truncated = _dump_rows(cursor)
         except psycopg2.Error as error:
-            results = [str(error)]
+            results, truncated = json.dumps([str(error)]), False
         logger.info(results)
 
-        event.set_results({"results": json.dumps(results)})
+        event.set_results({"results": results, "truncated": str(truncated)})
 
     def _on_test_tls_action(self, event: ActionEvent):
         """An action that allows us to run SQL queries from this charm."""
@@ -513,8 +657,12 @@ class ApplicationCharm(CharmBase):
             relation = self.second_database
         else:
             event.fail(message="invalid relation name")
+            return
 
-        databag = next(databag for databag in relation.fetch_relation_data().values())
+        databag = next(iter(relation.fetch_relation_data().values()), {})
+        if not databag:
+            event.fail(message="relation data not available")
+            return
 
         dbname = event.params["dbname"]
         user = databag.get("username")
@@ -525,8 +673,7 @@ class ApplicationCharm(CharmBase):
             dbname = f"{dbname}_readonly"
         else:
             host = databag.get("endpoints").split(",")[0]
-        endpoint = host.split(":")[0]
-        port = host.split(":")[1]
+        endpoint, port = host.split(":", 1)
 
         try:
             connection = self.connect_to_database(
@@ -553,11 +700,18 @@ class ApplicationCharm(CharmBase):
         Returns:
             psycopg2 connection object using the provided data
         """
-        connstr = f"dbname='{database}' user='{user}' host='{host}' port='{port}' password='{password}' connect_timeout=1"
+        params = {
+            "dbname": database,
+            "user": user,
+            "host": host,
+            "port": port,
+            "password": password,
+            "connect_timeout": 1,
+        }
         if tls:
-            connstr = f"{connstr} sslmode=require"
-        logger.debug(f"connecting to database: \n{connstr}")
-        connection = psycopg2.connect(connstr)
+            params["sslmode"] = "require"
+        logger.debug(f"connecting to database {database} on {host}:{port} as {user}")
+        connection = psycopg2.connect(**params)
         connection.autocommit = True
         return connection
 
@@ -3,8 +3,9 @@
 
 """This file is meant to run in the background continuously writing entries to PostgreSQL."""
 
-import multiprocessing
+import json
 import os
+import select
 import signal
 import sys
 from time import sleep
@@ -12,7 +13,18 @@ from time import sleep
 import psycopg2 as psycopg2
 
 run = True
-connection_string = None
+reload_config = False
+connection_params = None
+connection = None
+# Read end of the pipe that signals are written to (see signal.set_wakeup_fd).
+wakeup_fd = None
+
+# Server side cap (in milliseconds) on each write, replacing the watchdog process that used to
+# kill stuck writes. It's set for each write transaction (not as a startup option) so that it
+# survives PgBouncer transaction pooling.
+STATEMENT_TIMEOUT = 10000
+# How long to back off after a connection failure before retrying the same value.
+RECONNECT_INTERVAL = 1
 
 
 def _sigterm_handler(_signo, _stack_frame):
@@ -20,49 +32,112 @@ def _sigterm_handler(_signo, _stack_frame):
     run = False
 
 
+def _sighup_handler(_signo, _stack_frame):
+    # The config file was updated: reconnect (re-reading it) before the next write.
+    global reload_config
+    reload_config = True
+
+
+def _setup_signals():
+    global wakeup_fd
+    wakeup_fd, write_fd = os.pipe()
+    os.set_blocking(write_fd, False)
+    signal.set_wakeup_fd(write_fd)
+    signal.signal(signal.SIGTERM, _sigterm_handler)
+    signal.signal(signal.SIGHUP, _sighup_handler)
+
+
+def _wait(timeout: float):
+    """Sleeps for the given time, but wakes up as soon as a signal is received."""
+    if not timeout:
+        return
+    if wakeup_fd is None:
+        sleep(timeout)
+        return
+
+    ready, _, _ = select.select([wakeup_fd], [], [], timeout)
+    if ready:
+        # Drain the pipe, the signal handlers already ran.
+        os.read(wakeup_fd, 512)
+
+
 def _read_config_file():
     # Expected tmp access
     with open("/tmp/continuous_writes_config") as fd:  # noqa: S108
-        global connection_string
-        connection_string = fd.read().strip()
+        global connection_params
+        connection_params = json.load(fd)
 
 
-def continuous_writes(starting_number: int, sleep_interval: float = 0.0):
+def continuous_writes(starting_number: int, sleep_interval: float = 0.0, batch_size: int = 1):
     """Continuously writes data do PostgreSQL database.
 
     Args:
         starting_number: starting number that is used to write to the database and
             is continuously incremented after each write to the database.
         sleep_interval: how long to sleep between writes.
+        batch_size: how many numbers are written in a single statement.
     """
     write_value = starting_number
 
-    _read_config_file()
-
-    # Continuously write the record to the database (incrementing it at each iteration).
+    # Continuously write the records to the database (incrementing them at each iteration).
     while run:
-        process = multiprocessing.Process(target=write, args=[write_value])
-        process.daemon = True
-        process.start()
-        process.join(10)
-        if process.is_alive():
-            process.terminate()
-        else:
-            write_value = write_value + 1
-        sleep(sleep_interval)
+        if write(write_value, write_value + batch_size - 1):
+            write_value = write_value + batch_size
+        _wait(sleep_interval)
 
-    # Expected tmp access
-    with open("/tmp/last_written_value", "w") as fd:  # noqa: S108
+    # Expected tmp access. The value is written to a temporary file that is then renamed, so the
+    # charm (which waits for the file to appear) never reads it partially written.
+    with open("/tmp/last_written_value.tmp", "w") as fd:  # noqa: S108
         fd.write(str(write_value - 1))
+        fd.flush()
         os.fsync(fd)
+    os.rename("/tmp/last_written_value.tmp", "/tmp/last_written_value")  # noqa: S108
+
+    _close_connection()
+
 
+def _get_connection() -> psycopg2.extensions.connection:
+    """Returns the cached connection, (re)connecting if needed.
 
-def write(write_value: int) -> None:
-    """Writes to the database and handles expected errors."""
+    A new connection is opened if there is none, if it was closed or if the config file changed.
+    """
+    global connection, reload_config
+    if reload_config:
+        reload_config = False
+        _close_connection()
+    if connection is None or connection.closed:
+        _read_config_file()
+        connection = psycopg2.connect(**connection_params)
+        connection.autocommit = True
+    return connection
+
+
+def _close_connection() -> None:
+    """Closes and forgets the cached connection, so that the next write reconnects."""
+    global connection
+    if connection is not None:
+        connection.close()
+        connection = None
+
+
+def write(first_value: int, last_value: int) -> bool:
+    """Writes a range of numbers to the database in one statement and handles expected errors.
+
+    Returns:
+        whether the values should be considered written.
+    """
     try:
-        with psycopg2.connect(connection_string) as connection, connection.cursor() as cursor:
-            connection.autocommit = True
-            cursor.execute(f"INSERT INTO continuous_writes(number) VALUES({write_value});")
+        with _get_connection().cursor() as cursor:
+            # The numbers are generated by PostgreSQL, so the whole range is a single (atomic)
+            # statement that doesn't need to be built and sent row by row. The timeout is local
+            # to the transaction, which is sent in a single round trip.
+            cursor.execute(
+                "BEGIN;"
+                " SET LOCAL statement_timeout = %s;"
+                " INSERT INTO continuous_writes(number) SELECT generate_series(%s, %s);"
+                " COMMIT;",
+                (STATEMENT_TIMEOUT, first_value, last_value),
+            )
     except (
         psycopg2.InterfaceError,
         psycopg2.OperationalError,
@@ -70,24 +145,40 @@ def write(write_value: int) -> None:
     ):
         # We should not raise any of those exceptions that can happen when a connection failure
         # happens, for example, when a primary is being reelected after a failure on the old
-        # primary. In this case, force a timeout to not increment the written number.
-        sleep(30)
+        # primary (or when the statement timeout is hit). In this case, do not increment the
+        # written number and reconnect on the next write.
+        _close_connection()
+        _wait(RECONNECT_INTERVAL)
+        return False
     except psycopg2.Error:
         # If another error happens, like writing a duplicate number when a connection failed
         # in a previous iteration (but the transaction was already committed), just increment
-        # the number.
-        pass
-    finally:
-        connection.close()
+        # the numbers.
+        _rollback()
+    return True
+
+
+def _rollback() -> None:
+    """Ends the write transaction if an error left it aborted (COMMIT is skipped on errors)."""
+    if connection is None or connection.closed:
+        return
+    if connection.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("ROLLBACK;")
+    except psycopg2.Error:
+        _close_connection()
 
 
 def main():
     """Main executor."""
     starting_number = int(sys.argv[1])
     sleep_interval = int(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0
-    continuous_writes(starting_number, sleep_interval)
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    continuous_writes(starting_number, sleep_interval, batch_size)
 
 
 if __name__ == "__main__":
-    signal.signal(signal.SIGTERM, _sigterm_handler)
+    _setup_signals()
     main()
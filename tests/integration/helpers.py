@@ -2,9 +2,12 @@
 # Copyright 2024 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import asyncio
 import logging
 import subprocess
+import time
 
+from juju.unit import Unit
 from pytest_operator.plugin import OpsTest
 
 logger = logging.getLogger(__name__)
@@ -53,5 +56,69 @@ async def restart_machine(ops_test: OpsTest, unit_name: str) -> None:
         unit_name: The name of the unit to restart the machine
     """
     raw_hostname = await get_machine_from_unit(ops_test, unit_name)
-    restart_machine_command = f"lxc restart {raw_hostname}"
-    subprocess.check_call(restart_machine_command.split())
+    restart_machine_command = ["lxc", "restart", raw_hostname]
+    # Don't block the event loop (and the juju websocket) while the machine restarts.
+    process = await asyncio.create_subprocess_exec(*restart_machine_command)
+    if return_code := await process.wait():
+        raise subprocess.CalledProcessError(return_code, restart_machine_command)
+
+
+async def run_writes_action(unit: Unit, action: str) -> int:
+    """Run a continuous writes action that reports a number of writes.
+
+    Args:
+        unit: The unit running the continuous writes
+        action: The name of the action (show-continuous-writes or stop-continuous-writes)
+
+    Returns:
+        The number of writes reported by the action.
+    """
+    results = await (await unit.run_action(action)).wait()
+    return int(results.results["writes"])
+
+
+async def wait_for_writes(
+    unit: Unit,
+    baseline: int = 0,
+    min_delta: int = 50,
+    timeout: float = 30,
+    interval: float = 0.5,
+) -> int:
+    """Wait until the continuous writes counter advanced enough.
+
+    Args:
+        unit: The unit running the continuous writes
+        baseline: The number of writes to compare to
+        min_delta: How many writes over the baseline to wait for
+        timeout: How long to wait for the writes, in seconds
+        interval: How long to wait between checks, in seconds
+
+    Returns:
+        The last number of writes shown by the unit (which may be lower than
+        the expected one if the timeout expired).
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        writes = await run_writes_action(unit, "show-continuous-writes")
+        if writes >= baseline + min_delta or time.monotonic() >= deadline:
+            return writes
+        await asyncio.sleep(interval)
+
+
+async def sample_and_stop_writes(
+    unit: Unit, baseline: int = 0, delay: float = 1
+) -> tuple[int, int]:
+    """Sample the continuous writes counter once it advanced, then stop the writes.
+
+    Args:
+        unit: The unit running the continuous writes
+        baseline: The number of writes the sample must advance from
+        delay: How long to keep writing after the sample, in seconds
+
+    Returns:
+        The sampled number of writes and the last written value reported on stop.
+    """
+    sampled_writes = await wait_for_writes(unit, baseline)
+    # The writes are already known to be increasing, so a short delay is enough to see more.
+    await asyncio.sleep(delay)
+    return sampled_writes, await run_writes_action(unit, "stop-continuous-writes")
@@ -3,8 +3,8 @@
 # See LICENSE file for licensing details.
 
 import asyncio
+import json
 import logging
-import time
 
 import pytest
 from juju.relation import Relation
@@ -12,7 +12,7 @@ from lightkube.core.client import Client
 from lightkube.resources.core_v1 import Pod
 from pytest_operator.plugin import OpsTest
 
-from .helpers import restart_machine
+from .helpers import restart_machine, sample_and_stop_writes, wait_for_writes
 
 logger = logging.getLogger(__name__)
 
@@ -27,8 +27,9 @@ async def integrate(ops_test: OpsTest, relation1: str, relation2: str) -> Relati
 
 
 @pytest.mark.group(1)
-async def test_smoke(ops_test: OpsTest) -> None:
-    """Verify that the charm works with latest Postgresql and Pgbouncer."""
+@pytest.mark.abort_on_fail
+async def test_build_and_deploy(ops_test: OpsTest) -> None:
+    """Deploy the charm with latest Postgresql and Pgbouncer, shared by the other tests."""
     logger.info("Deploy charms")
     is_k8s = ops_test.model.info.provider_type == "kubernetes"
 
@@ -62,38 +63,26 @@ async def test_smoke(ops_test: OpsTest) -> None:
             series="jammy",
         ),
     )
-    await integrate(ops_test, postgresql, pgbouncer)
-    await integrate(ops_test, f"{TEST_APP_NAME}:database", pgbouncer)
+    await asyncio.gather(
+        integrate(ops_test, postgresql, pgbouncer),
+        integrate(ops_test, f"{TEST_APP_NAME}:database", pgbouncer),
+    )
     await ops_test.model.wait_for_idle(
         apps=[postgresql, pgbouncer, TEST_APP_NAME], status="active", timeout=1000
     )
 
-    logger.info("Test continuous writes")
-    await (
-        await ops_test.model.applications[TEST_APP_NAME]
-        .units[0]
-        .run_action("start-continuous-writes")
-    ).wait()
 
-    time.sleep(10)
+@pytest.mark.group(1)
+async def test_smoke(ops_test: OpsTest) -> None:
+    """Verify that the charm works with latest Postgresql and Pgbouncer."""
+    unit = ops_test.model.applications[TEST_APP_NAME].units[0]
+
+    logger.info("Test continuous writes")
+    await (await unit.run_action("start-continuous-writes")).wait()
 
     logger.info("Show continuous writes")
-    results = await (
-        await ops_test.model.applications[TEST_APP_NAME]
-        .units[0]
-        .run_action("show-continuous-writes")
-    ).wait()
-    show_writes = int(results.results["writes"])
-
-    time.sleep(10)
-
-    results = await (
-        await ops_test.model.applications[TEST_APP_NAME]
-        .units[0]
-        .run_action("stop-continuous-writes")
-    ).wait()
-
-    writes = int(results.results["writes"])
+    show_writes, writes = await sample_and_stop_writes(unit)
+
     assert writes > 0
     assert writes > show_writes
 
@@ -103,70 +92,39 @@ async def test_smoke(ops_test: OpsTest) -> None:
         "relation-name": "database",
         "readonly": False,
     }
-    results = await (
-        await ops_test.model.applications[TEST_APP_NAME].units[0].run_action("run-sql", **params)
-    ).wait()
-    count, maximum = results.results["results"].strip("[]").split(", ")
-    count = int(count)
-    maximum = int(maximum)
+    results = await (await unit.run_action("run-sql", **params)).wait()
+    # The run-sql action returns the rows as a JSON list.
+    [(count, maximum)] = json.loads(results.results["results"])
 
     assert writes == count == maximum
 
-    await (
-        await ops_test.model.applications[TEST_APP_NAME]
-        .units[0]
-        .run_action("clear-continuous-writes")
-    ).wait()
+    await (await unit.run_action("clear-continuous-writes")).wait()
 
 
 @pytest.mark.group(1)
 async def test_restart(ops_test: OpsTest) -> None:
     """Verify that the charm works with latest Postgresql and Pgbouncer."""
     is_k8s = ops_test.model.info.provider_type == "kubernetes"
+    unit = ops_test.model.applications[TEST_APP_NAME].units[0]
 
     logger.info("Start continuous writes")
-    await (
-        await ops_test.model.applications[TEST_APP_NAME]
-        .units[0]
-        .run_action("start-continuous-writes")
-    ).wait()
-
-    time.sleep(10)
+    await (await unit.run_action("start-continuous-writes")).wait()
 
-    results = await (
-        await ops_test.model.applications[TEST_APP_NAME]
-        .units[0]
-        .run_action("show-continuous-writes")
-    ).wait()
-    early_writes = int(results.results["writes"])
+    early_writes = await wait_for_writes(unit)
 
     if is_k8s:
         logger.info("Deleting the pod")
         client = Client(namespace=ops_test.model.info.name)
-        client.delete(Pod, name=f"{TEST_APP_NAME}-0")
+        await asyncio.to_thread(client.delete, Pod, name=f"{TEST_APP_NAME}-0")
     else:
         logger.info("Restarting lxc")
-        await restart_machine(ops_test, ops_test.model.applications[TEST_APP_NAME].units[0].name)
+        await restart_machine(ops_test, unit.name)
 
     logger.info("Wait for idle")
     await ops_test.model.wait_for_idle(apps=[TEST_APP_NAME], status="active", timeout=600)
 
     logger.info("Check that writes are increasing")
-    results = await (
-        await ops_test.model.applications[TEST_APP_NAME]
-        .units[0]
-        .run_action("show-continuous-writes")
-    ).wait()
-    show_writes = int(results.results["writes"])
-
-    time.sleep(10)
-
-    results = await (
-        await ops_test.model.applications[TEST_APP_NAME]
-        .units[0]
-        .run_action("stop-continuous-writes")
-    ).wait()
-
-    writes = int(results.results["writes"])
+    show_writes, writes = await sample_and_stop_writes(unit, early_writes)
+
     assert writes > 0
     assert writes > show_writes > early_writes
@@ -0,0 +1,120 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import os
+import threading
+import time
+
+import charm
+from charm import FileWatcher, _dump_rows
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetched = 0
+
+    def fetchmany(self, size):
+        batch = self.rows[self.fetched : self.fetched + size]
+        self.fetched += len(batch)
+        return batch
+
+
+def _later(function, *args, delay=0.1):
+    timer = threading.Timer(delay, function, args)
+    timer.start()
+    return timer
+
+
+def _write(path, value):
+    with open(path, "w") as fd:
+        fd.write(value)
+
+
+def test_file_watcher_existing_file(tmp_path):
+    path = tmp_path / "last_written_value"
+    path.write_text("1")
+
+    with FileWatcher(str(path)) as watcher:
+        assert watcher.wait(0)
+
+
+def test_file_watcher_written(tmp_path):
+    path = tmp_path / "last_written_value"
+
+    with FileWatcher(str(path)) as watcher:
+        timer = _later(_write, path, "1")
+        assert watcher.wait(5)
+        timer.join()
+    assert path.read_text() == "1"
+
+
+def test_file_watcher_renamed(tmp_path):
+    path = tmp_path / "last_written_value"
+    temporary_path = tmp_path / "last_written_value.tmp"
+    temporary_path.write_text("1")
+
+    with FileWatcher(str(path)) as watcher:
+        timer = _later(os.rename, temporary_path, path)
+        assert watcher.wait(5)
+        timer.join()
+    assert path.read_text() == "1"
+
+
+def test_file_watcher_ignores_other_files(tmp_path):
+    path = tmp_path / "last_written_value"
+
+    with FileWatcher(str(path)) as watcher:
+        timer = _later(_write, tmp_path / "other", "1")
+        start = time.monotonic()
+        assert not watcher.wait(0.5)
+        assert time.monotonic() - start >= 0.5
+        timer.join()
+
+
+def _create(directory, value):
+    directory.mkdir()
+    _write(directory / "last_written_value", value)
+
+
+def test_file_watcher_polls_without_inotify(tmp_path):
+    # The watch can't be added to a missing directory, like when inotify limits are reached.
+    directory = tmp_path / "missing"
+    path = directory / "last_written_value"
+
+    with FileWatcher(str(path)) as watcher:
+        assert not watcher.wait(0.5)
+        timer = _later(_create, directory, "1")
+        assert watcher.wait(5)
+        timer.join()
+    assert path.read_text() == "1"
+
+
+def test_dump_rows():
+    rows = [(number, f"row {number}", None) for number in range(5000)]
+
+    results, truncated = _dump_rows(FakeCursor(rows))
+
+    assert results == json.dumps(rows)
+    assert not truncated
+
+
+def test_dump_rows_empty():
+    assert _dump_rows(FakeCursor([])) == ("[]", False)
+
+
+def test_dump_rows_truncated(monkeypatch):
+    monkeypatch.setattr(charm, "RUN_SQL_FETCH_SIZE", 10)
+    monkeypatch.setattr(charm, "RUN_SQL_MAX_RESULTS_SIZE", 1000)
+    rows = [(number,) for number in range(1000, 2000)]
+    cursor = FakeCursor(rows)
+
+    results, truncated = _dump_rows(cursor)
+
+    assert truncated
+    assert len(results) <= 1000
+    dumped_rows = json.loads(results)
+    assert dumped_rows == [list(row) for row in rows[: len(dumped_rows)]]
+    # Only the batch holding the first row that doesn't fit was fetched.
+    assert cursor.fetched == (len(dumped_rows) // 10 + 1) * 10
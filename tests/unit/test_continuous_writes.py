@@ -0,0 +1,116 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import signal
+from types import SimpleNamespace
+
+import psycopg2
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR
+
+import continuous_writes
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+    def execute(self, query, params=None):
+        self.connection.queries.append(query)
+        if query == "ROLLBACK;":
+            self.connection.info.transaction_status = TRANSACTION_STATUS_IDLE
+            return
+        if self.connection.errors:
+            error = self.connection.errors.pop(0)
+            if isinstance(error, psycopg2.errors.UniqueViolation):
+                # An error inside the explicit transaction block skips the COMMIT.
+                self.connection.info.transaction_status = TRANSACTION_STATUS_INERROR
+            raise error
+
+
+class FakeConnection:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.queries = []
+        self.closed = 0
+        self.info = SimpleNamespace(transaction_status=TRANSACTION_STATUS_IDLE)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = 1
+
+
+def _connect(monkeypatch, *connections):
+    """Makes the writer open the given connections, in order."""
+    pending = list(connections)
+    monkeypatch.setattr(continuous_writes, "connection", None)
+    monkeypatch.setattr(continuous_writes, "reload_config", False)
+    monkeypatch.setattr(continuous_writes, "connection_params", {})
+    monkeypatch.setattr(continuous_writes, "_read_config_file", lambda: None)
+    monkeypatch.setattr(continuous_writes, "_wait", lambda _: None)
+    monkeypatch.setattr(psycopg2, "connect", lambda **_: pending.pop(0))
+
+
+def test_write(monkeypatch):
+    connection = FakeConnection()
+    _connect(monkeypatch, connection)
+
+    assert continuous_writes.write(1, 10)
+    assert continuous_writes.write(11, 20)
+
+    assert len(connection.queries) == 2
+    assert "SET LOCAL statement_timeout" in connection.queries[0]
+    assert not connection.closed
+
+
+def test_write_duplicate(monkeypatch):
+    connection = FakeConnection(psycopg2.errors.UniqueViolation())
+    _connect(monkeypatch, connection)
+
+    # The numbers were already written before a connection failure: skip them.
+    assert continuous_writes.write(1, 1)
+    assert connection.queries[-1] == "ROLLBACK;"
+    assert connection.info.transaction_status == TRANSACTION_STATUS_IDLE
+
+    # The same connection keeps being used.
+    assert continuous_writes.write(2, 2)
+    assert not connection.closed
+    assert continuous_writes.connection is connection
+
+
+@pytest.mark.parametrize("error", [psycopg2.OperationalError(), psycopg2.errors.QueryCanceled()])
+def test_write_connection_error(monkeypatch, error):
+    connection = FakeConnection(error)
+    new_connection = FakeConnection()
+    _connect(monkeypatch, connection, new_connection)
+
+    # The same numbers are retried with a new connection.
+    assert not continuous_writes.write(1, 1)
+    assert connection.closed
+    assert "ROLLBACK;" not in connection.queries
+    assert continuous_writes.connection is None
+
+    assert continuous_writes.write(1, 1)
+    assert continuous_writes.connection is new_connection
+
+
+def test_write_reload_config(monkeypatch):
+    connection = FakeConnection()
+    new_connection = FakeConnection()
+    _connect(monkeypatch, connection, new_connection)
+
+    assert continuous_writes.write(1, 1)
+    continuous_writes._sighup_handler(signal.SIGHUP, None)
+    assert continuous_writes.write(2, 2)
+
+    assert connection.closed
+    assert continuous_writes.connection is new_connection
+    assert not continuous_writes.reload_config